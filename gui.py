@@ -3,15 +3,24 @@ import os
 import sys
 import tkinter as tk
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from tkinter import filedialog, messagebox, ttk
 
 import pandas as pd
-from PIL import Image, ImageTk
 
-# Import the main functionality from main.py
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from main import generate_calendar_html
+# Import the main functionality from main.py, its directory is already on the path when run as a script
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.append(SCRIPT_DIR)
+from main import generate_task_colors, read_tasks, write_calendar_html  # noqa: E402
+
+# Values of the month dropdown, empty for the full year
+MONTH_VALUES = ("",) + tuple(calendar.month_name)[1:]
+
+
+class ExcelInputError(Exception):
+    """The Excel file could not be read or lacks the columns needed for the calendar"""
 
 
 class PlannerCalendarGUI:
@@ -27,6 +36,9 @@ class PlannerCalendarGUI:
         # Check if the file exists before trying to load
         if os.path.exists(icon_path):
             try:
+                # Pillow is only imported when there is an icon to load, it is slow to import
+                from PIL import Image, ImageTk
+
                 # Open the image using Pillow
                 img = Image.open(icon_path)
                 # Convert it to a Tkinter PhotoImage object
@@ -53,6 +65,12 @@ class PlannerCalendarGUI:
         self.color_by_bucket = tk.BooleanVar(value=False)
         self.prefix_labels = tk.BooleanVar(value=False)
         self.alternate_colors = tk.BooleanVar(value=False)
+
+        # Parsed Excel files, {path: (mtime, tasks_df)}, so regenerating with new options skips the read
+        self._excel_cache = {}
+
+        # Reading the Excel file and writing the HTML runs here to keep the window responsive
+        self._executor = ThreadPoolExecutor(max_workers=1)
         
         # Set current year as default
         current_year = datetime.now().year
@@ -81,21 +99,21 @@ class PlannerCalendarGUI:
         generate_frame = ttk.Frame(main_frame)
         generate_frame.pack(fill=tk.X, pady=10)
         
-        generate_btn = ttk.Button(
+        self.generate_btn = ttk.Button(
             generate_frame, 
             text="Generate Calendar", 
             command=self.generate_calendar,
             style="Generate.TButton"
         )
-        generate_btn.pack(side=tk.RIGHT, padx=5)
+        self.generate_btn.pack(side=tk.RIGHT, padx=5)
         
-        view_btn = ttk.Button(
+        self.view_btn = ttk.Button(
             generate_frame, 
             text="Generate & View", 
             command=self.generate_and_view_calendar,
             style="Generate.TButton"
         )
-        view_btn.pack(side=tk.RIGHT, padx=5)
+        self.view_btn.pack(side=tk.RIGHT, padx=5)
         
         # Create custom styles
         self._setup_styles()
@@ -152,8 +170,7 @@ class PlannerCalendarGUI:
         
         # Month selection
         ttk.Label(options_frame, text="Month:").grid(row=1, column=0, sticky=tk.W, pady=5)
-        month_values = [""] + list(calendar.month_name)[1:]
-        month_dropdown = ttk.Combobox(options_frame, textvariable=self.month, values=month_values, width=15)
+        month_dropdown = ttk.Combobox(options_frame, textvariable=self.month, values=MONTH_VALUES, width=15)
         month_dropdown.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
         ttk.Label(options_frame, text="(Leave empty for full year)").grid(
             row=1, column=2, sticky=tk.W, pady=5
@@ -337,156 +354,142 @@ class PlannerCalendarGUI:
             
         return True
 
-    def generate_calendar(self):
-        """Generate the calendar based on user inputs"""
+    def read_tasks_cached(self, excel_file):
+        """Read the Tasks sheet, reusing the previous result if the file has not changed"""
+        # The file is opened once, its modification time and its contents come from the same handle
+        with open(excel_file, "rb") as f:
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+            cached = self._excel_cache.get(excel_file)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, read_tasks(f))
+                self._excel_cache[excel_file] = cached
+        # Calendar generation modifies the date columns, so hand out a copy
+        return cached[1].copy()
+
+    def generate_calendar(self, view=False):
+        """Generate the calendar based on user inputs in a background thread"""
         if not self.validate_inputs():
             return
         
+        # Tk variables must only be read from the main thread, so take a snapshot for the worker
+        options = {
+            "excel_file": self.excel_file_path.get(),
+            "output_file": self.output_file_path.get(),
+            "year": self.year.get().strip(),
+            "month": self.month.get().strip(),
+            "no_wrap_text": self.no_wrap_text.get(),
+            "saturation": self.color_saturation.get(),
+            "lightness": self.color_lightness.get(),
+            "color_by_label": self.color_by_label.get(),
+            "color_by_bucket": self.color_by_bucket.get(),
+            "alternate_colors": self.alternate_colors.get(),
+            "prefix_labels": self.prefix_labels.get(),
+        }
+        
+        self.set_generating(True)
+        self.status_var.set("Reading Excel file...")
+        future = self._executor.submit(self._do_generate, options)
+        future.add_done_callback(lambda f: self.root.after(0, self._on_generate_done, f, view))
+
+    def set_generating(self, generating):
+        """Disable the generate buttons while a calendar is being generated"""
+        state = tk.DISABLED if generating else tk.NORMAL
+        self.generate_btn.configure(state=state)
+        self.view_btn.configure(state=state)
+
+    def _set_status(self, message):
+        """Update the status bar from the worker thread"""
+        self.root.after(0, self.status_var.set, message)
+
+    def _do_generate(self, options):
+        """Read the Excel file and write the calendar HTML, runs on the worker thread"""
+        # Read Excel file
         try:
-            self.status_var.set("Reading Excel file...")
-            self.root.update_idletasks()
-            
-            # Read Excel file
-            try:
-                tasks_df = pd.read_excel(
-                    self.excel_file_path.get(), 
-                    sheet_name="Tasks", 
-                    engine="openpyxl"
-                )
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to read Excel file: {str(e)}")
-                self.status_var.set("Ready")
-                return
-            
-            # Check required columns
-            required_columns = ["Task Name", "Start date", "Due date"]
-            missing_cols = [col for col in required_columns if col not in tasks_df.columns]
-            if missing_cols:
-                messagebox.showerror(
-                    "Error", 
-                    f"Missing required columns in 'Tasks' sheet: {', '.join(missing_cols)}"
-                )
-                self.status_var.set("Ready")
-                return
-            
-            # Generate task colors
-            self.status_var.set("Generating task colors...")
-            self.root.update_idletasks()
-            
-            unique_tasks = sorted(tasks_df["Task Name"].astype(str).unique())
-            task_colors = {}
-            
-            import colorsys
-            import hashlib
-            
-            # Constants
-            HUE_STEP = 29  # From main.py
-            
-            for task_index, task_name in enumerate(unique_tasks):
-                hue = None
-                
-                # Color by label logic
-                if self.color_by_label.get():
-                    matching_rows = tasks_df.loc[tasks_df["Task Name"] == task_name]
-                    if not matching_rows.empty:
-                        label = matching_rows["Labels"].iloc[0]
-                        if pd.notna(label):
-                            try:
-                                hash_object = hashlib.md5(str(label).encode())
-                                hash_digest = hash_object.hexdigest()
-                                if self.alternate_colors.get():
-                                    hue = (int(HUE_STEP * task_index) % 360) / 360.0
-                                else:
-                                    hue = (int(hash_digest, 16) % 360) / 360.0
-                            except AttributeError:
-                                pass
-                
-                # Color by bucket logic
-                if self.color_by_bucket.get():
-                    matching_rows = tasks_df.loc[tasks_df["Task Name"] == task_name]
-                    if not matching_rows.empty:
-                        bucket = matching_rows["Bucket Name"].iloc[0]
-                        if pd.notna(bucket):
-                            try:
-                                hash_object = hashlib.md5(str(bucket).encode())
-                                hash_digest = hash_object.hexdigest()
-                                if self.alternate_colors.get():
-                                    hue = (int(HUE_STEP * task_index) % 360) / 360.0
-                                else:
-                                    hue = (int(hash_digest, 16) % 360) / 360.0
-                            except AttributeError:
-                                pass
-                
-                # If hue wasn't set by label or bucket
-                if hue is None:
-                    hash_object = hashlib.md5(str(task_name).encode())
-                    hash_digest = hash_object.hexdigest()
-                    hue = (int(hash_digest, 16) % 360) / 360.0
-                
-                # Generate color
-                rgb = colorsys.hls_to_rgb(hue, self.color_lightness.get(), self.color_saturation.get())
-                hex_color = f"#{int(rgb[0] * 255):02x}{int(rgb[1] * 255):02x}{int(rgb[2] * 255):02x}"
-                task_colors[task_name] = hex_color
-            
-            # Determine the year for the calendar
-            target_year = None
-            year_str = self.year.get().strip()
-            if year_str:
-                target_year = int(year_str)
-            else:
-                # Find the earliest year from valid start dates
-                valid_start_dates = pd.to_datetime(tasks_df["Start date"], errors="coerce").dropna()
-                if not valid_start_dates.empty:
-                    target_year = valid_start_dates.min().year
-                else:
-                    target_year = datetime.now().year
-            
-            # Determine if a specific month is selected
-            target_month = None
-            month_str = self.month.get().strip()
-            if month_str:
-                target_month = month_str
-            
-            # Update status message
-            if target_month:
-                self.status_var.set(f"Generating calendar for {target_month} {target_year}...")
-            else:
-                self.status_var.set(f"Generating calendar for {target_year}...")
-            self.root.update_idletasks()
-            
-            # Generate HTML
-            html_content = generate_calendar_html(
-                tasks_df, 
-                self.no_wrap_text.get(), 
-                target_year, 
-                task_colors,
-                self.prefix_labels.get(),
-                target_month
-            )
-            
-            # Write to file
-            with open(self.output_file_path.get(), "w", encoding="utf-8") as f:
-                f.write(html_content)
-            
-            self.status_var.set(f"Calendar generated successfully: {self.output_file_path.get()}")
-            
-            return True
-            
+            tasks_df = self.read_tasks_cached(options["excel_file"])
+        except Exception as e:
+            raise ExcelInputError(f"Failed to read Excel file: {str(e)}") from e
+        
+        # Check required columns
+        required_columns = ["Task Name", "Start date", "Due date"]
+        columns = set(tasks_df.columns)
+        missing_cols = [col for col in required_columns if col not in columns]
+        if missing_cols:
+            raise ExcelInputError(f"Missing required columns in 'Tasks' sheet: {', '.join(missing_cols)}")
+        
+        # Generate task colors
+        self._set_status("Generating task colors...")
+        
+        task_colors = generate_task_colors(
+            tasks_df,
+            options["saturation"],
+            options["lightness"],
+            options["color_by_label"],
+            options["color_by_bucket"],
+            options["alternate_colors"],
+        )
+        
+        # Determine the year for the calendar
+        target_year = None
+        if options["year"]:
+            target_year = int(options["year"])
+        else:
+            # Find the earliest year from valid start dates, read_tasks already parsed them
+            earliest = tasks_df["Start date"].min()  # NaT is skipped
+            target_year = earliest.year if pd.notna(earliest) else datetime.now().year
+        
+        # Determine if a specific month is selected
+        target_month = options["month"] or None
+        
+        # Update status message
+        if target_month:
+            self._set_status(f"Generating calendar for {target_month} {target_year}...")
+        else:
+            self._set_status(f"Generating calendar for {target_year}...")
+        
+        # Generate HTML straight into the output file, an existing file is only replaced on success
+        write_calendar_html(
+            options["output_file"],
+            tasks_df, 
+            options["no_wrap_text"], 
+            target_year, 
+            task_colors,
+            options["prefix_labels"],
+            target_month,
+        )
+        
+        return options["output_file"]
+
+    def _on_generate_done(self, future, view):
+        """Report the result of a background generation, runs on the main thread"""
+        self.set_generating(False)
+        try:
+            output_file = future.result()
+        except ExcelInputError as e:
+            messagebox.showerror("Error", str(e))
+            self.status_var.set("Ready")
+            return
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
             self.status_var.set("Error occurred")
-            return False
+            return
+        
+        self.status_var.set(f"Calendar generated successfully: {output_file}")
+        if view:
+            self.view_calendar(output_file)
 
     def generate_and_view_calendar(self):
         """Generate the calendar and open it in the default web browser"""
-        if self.generate_calendar():
-            try:
-                self.status_var.set("Opening calendar in web browser...")
-                webbrowser.open(f"file://{os.path.abspath(self.output_file_path.get())}")
-                self.status_var.set("Calendar opened in web browser")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to open browser: {str(e)}")
-                self.status_var.set("Failed to open browser")
+        self.generate_calendar(view=True)
+
+    def view_calendar(self, output_file):
+        """Open a generated calendar in the default web browser"""
+        try:
+            self.status_var.set("Opening calendar in web browser...")
+            webbrowser.open(f"file://{os.path.abspath(output_file)}")
+            self.status_var.set("Calendar opened in web browser")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open browser: {str(e)}")
+            self.status_var.set("Failed to open browser")
 
 
 def main():
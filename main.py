@@ -1,21 +1,214 @@
 import argparse
 import calendar
-import colorsys
-import hashlib
+import importlib.util
+import io
+import os
+import re
+import shutil
 import sys
-from datetime import datetime, timedelta
+import uuid
+from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
 # Constant for hue step
 HUE_STEP = 29
 
-def generate_calendar_html(tasks_df, no_wrap_text, year, task_colors, prefix_label, month=None):
+# Columns of the 'Tasks' sheet used to build the calendar, the rest of the export is not parsed
+TASK_COLUMNS = ("Task Name", "Start date", "Due date", "Completed Date", "Labels", "Bucket Name")
+
+# Prefer the Rust based calamine reader when it is installed, it parses .xlsx files much faster
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+
+# Basic HTML escaping for task names, done in a single pass. Semicolons are dropped.
+ESCAPE_TABLE = str.maketrans({";": "", "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"})
+
+# Month numbers by lowercase month name, e.g. "january" -> 1
+MONTH_NUMBERS = {name.lower(): num for num, name in enumerate(calendar.month_name) if num > 0}
+
+# Header row of every month, weeks start on Sunday
+DAY_HEADERS_HTML = "".join(
+    f'    <div class="day-header">{day_abbr}</div>'
+    for day_abbr in ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+)
+
+# Stylesheet of the generated page, {grid_columns} and {wrapping} are filled in per calendar
+CSS_TEMPLATE = """
+    body {{ font-family: sans-serif; font-size: 8px; }}
+    .year-grid {{ display: grid; grid-template-columns: {grid_columns}; gap: 20px; }}
+    .month {{ border: 1px solid #ccc; padding: 5px; }}
+    .month-title {{ text-align: center; font-weight: bold; font-size: 12px; margin-bottom: 5px; }}
+    .calendar-grid {{ display: grid; grid-template-columns: repeat(7, 1fr); border-collapse: collapse;
+    table-layout: fixed; width: 100%; }}
+    .day-header {{ text-align: center; font-weight: bold; background-color: #f0f0f0; font-size: 9px;
+    padding: 2px; border: 1px solid #ddd; }}
+    .day {{ border: 1px solid #ddd; vertical-align: top; height: 70px; /* Adjust as needed */
+    padding: 2px; overflow: hidden; position: relative; }}
+    .day.other-month {{ background-color: #f9f9f9; color: #aaa; }}
+    .day-number {{ position: absolute; top: 1px; left: 1px; font-weight: bold; font-size: 9px;
+    color: #333; }}
+    .tasks {{ margin-top: 12px; /* Space below day number */ line-height: 1.1; }}
+    .task {{ display: block; white-space: {wrapping}; overflow: hidden; text-overflow: ellipsis;
+    margin-bottom: 1px; padding: 0 1px; border-radius: 2px; border: 1px solid #ccc; color: #000;
+    /* Ensure text is black */}}
+    /* Single month view */
+    .single-month .day {{ height: 100px; }}
+    .single-month .day-number {{ font-size: 12px; }}
+    .single-month .day-header {{ font-size: 12px; }}
+    .single-month .task {{ font-size: 9px; }}
+    /* Print specific styles */
+    @media print {{
+        @page {{ size: 17in 11in landscape; margin: 0.5in; }} /* 11x17 Landscape */
+        body {{ font-size: 7pt; -webkit-print-color-adjust: exact; print-color-adjust: exact; }}
+        .year-grid {{ gap: 15px; }}
+        .month {{ page-break-inside: avoid; border: 1px solid #aaa; }}
+        .day {{ height: 65px; border: 1px solid #ccc; }}
+        .day-header {{ font-size: 8pt; padding: 1px; }}
+        .day-number {{ font-size: 8pt; }}
+        .task {{ border: 1px solid #b0dde4; font-size: 5pt;}}
+        /* Hide non-essential elements for print */
+        /* Add any elements here you want to hide during printing */
+    }}
+"""
+# Comments and indentation only help when reading the source, strip them from the generated files
+CSS_TEMPLATE = re.sub(r"/\*.*?\*/", "", CSS_TEMPLATE, flags=re.DOTALL)
+CSS_TEMPLATE = re.sub(r"\s*([{};:,])\s*", r"\1", re.sub(r"\s+", " ", CSS_TEMPLATE)).strip()
+
+# Constants used by the HLS to RGB conversion (same values as the colorsys module)
+ONE_THIRD = 1.0 / 3.0
+ONE_SIXTH = 1.0 / 6.0
+TWO_THIRD = 2.0 / 3.0
+
+
+def _hash_hues(keys):
+    """
+    Maps each key to a stable hue by hashing its string value modulo 360.
+
+    The hash is pandas' vectorized SipHash with a fixed key, so hues are the same
+    from run to run without paying for a cryptographic digest per key.
+
+    Args:
+        keys (pd.Series): The values to hash (labels, buckets or task names).
+
+    Returns:
+        np.ndarray: The hues (0.0-1.0) as a float array.
+    """
+    hashes = pd.util.hash_pandas_object(keys.astype(str), index=False).to_numpy()
+    return (hashes % 360) / 360.0
+
+
+def _hls_to_hex(hues, lightness, saturation):
+    """
+    Vectorized equivalent of colorsys.hls_to_rgb followed by hex formatting.
+
+    Args:
+        hues (np.ndarray): The hues (0.0-1.0) to convert.
+        lightness (float): Lightness shared by all colors (0.0-1.0).
+        saturation (float): Saturation shared by all colors (0.0-1.0).
+
+    Returns:
+        list: The colors as "#rrggbb" strings, in the same order as the hues.
+    """
+    if lightness <= 0.5:
+        m2 = lightness * (1.0 + saturation)
+    else:
+        m2 = lightness + saturation - (lightness * saturation)
+    m1 = 2.0 * lightness - m2
+
+    channels = []
+    for offset in (ONE_THIRD, 0.0, -ONE_THIRD):
+        hue = (hues + offset) % 1.0
+        channels.append(
+            np.select(
+                [hue < ONE_SIXTH, hue < 0.5, hue < TWO_THIRD],
+                [m1 + (m2 - m1) * hue * 6.0, m2, m1 + (m2 - m1) * (TWO_THIRD - hue) * 6.0],
+                m1,
+            )
+        )
+    r, g, b = (np.stack(channels) * 255).astype(np.uint32)
+    return [f"#{rgb:06x}" for rgb in ((r << 16) | (g << 8) | b).tolist()]
+
+
+def read_tasks(excel_file):
+    """
+    Reads the 'Tasks' sheet of a Planner Excel export.
+
+    Args:
+        excel_file (str or file-like): Path to, or binary file object of, the Microsoft Planner
+                                       Excel export file (.xlsx).
+
+    Returns:
+        pd.DataFrame: The tasks, limited to the columns listed in TASK_COLUMNS. Date columns are
+                      parsed to datetimes and repetitive text columns are stored as categoricals.
+    """
+    tasks_df = pd.read_excel(
+        excel_file, sheet_name="Tasks", engine=EXCEL_ENGINE, usecols=lambda col: col in TASK_COLUMNS
+    )
+
+    # Parse the date columns once, dates that are not valid become NaT
+    for col in tasks_df.columns.intersection(["Start date", "Due date", "Completed Date"]):
+        tasks_df[col] = pd.to_datetime(tasks_df[col], errors="coerce")
+
+    # Names, labels and buckets repeat a lot, categories use less memory and compare faster
+    for col in tasks_df.columns.intersection(["Task Name", "Labels", "Bucket Name"]):
+        if tasks_df[col].nunique() < 0.5 * len(tasks_df):
+            tasks_df[col] = tasks_df[col].astype("category")
+
+    return tasks_df
+
+
+def generate_task_colors(
+    tasks_df, saturation, lightness, color_by_label=False, color_by_bucket=False, alternate_colors=False
+):
+    """
+    Assigns a background color to every unique task name.
+
+    Args:
+        tasks_df (pd.DataFrame): DataFrame containing tasks with 'Task Name' and optionally
+                                 'Labels' and 'Bucket Name'.
+        saturation (float): Saturation for the generated colors (0.0-1.0).
+        lightness (float): Lightness for the generated colors (0.0-1.0).
+        color_by_label (bool): Whether tasks with the same (first) label share a color.
+        color_by_bucket (bool): Whether tasks in the same (first) bucket share a color.
+        alternate_colors (bool): Whether to step through the hue wheel sequentially instead of
+                                 hashing the label or bucket.
+
+    Returns:
+        dict: A dictionary mapping task names to their respective color codes.
+    """
+    task_names = tasks_df["Task Name"].astype(str)
+    unique_tasks = pd.Series(sorted(task_names.unique()), dtype=object)  # Ensure consistent order
+
+    hues = np.empty(len(unique_tasks))
+    has_key = np.zeros(len(unique_tasks), dtype=bool)
+
+    key_column = "Labels" if color_by_label else "Bucket Name" if color_by_bucket else None
+    # Without the column in the export every task falls back to the task name hash
+    if key_column in tasks_df.columns:
+        # First label/bucket of every task, looked up with a single hash join
+        keys = tasks_df[key_column].set_axis(task_names)
+        keys = keys[~keys.index.duplicated()].loc[unique_tasks]
+        has_key = keys.notna().to_numpy()
+        if alternate_colors:
+            hues[has_key] = (np.flatnonzero(has_key) * HUE_STEP % 360) / 360.0
+        else:
+            hues[has_key] = _hash_hues(keys[has_key])
+
+    # Use a hash of the task name (or label) for potentially more stable color assignments
+    # if the task list changes slightly run-to-run. Only tasks without a label/bucket are hashed here.
+    hues[~has_key] = _hash_hues(unique_tasks[~has_key])
+
+    return dict(zip(unique_tasks, _hls_to_hex(hues, lightness, saturation), strict=True))
+
+
+def generate_calendar_html(tasks_df, no_wrap_text, year, task_colors, prefix_label, month=None, out=None):
     """
     Generates a year-at-a-glance HTML calendar or a single month calendar.
 
     Args:
-        tasks_df (pd.DataFrame): DataFrame containing tasks with 'Start date', 'Due date', and 'Task Name'.
+        tasks_df (pd.DataFrame): DataFrame containing tasks with 'Start date', 'Due date', 'Completed Date'
+                                 and 'Task Name', with the date columns already parsed (see read_tasks).
         no_wrap_text (bool): Whether to prevent task names from wrapping to the next
                              line if they exceed the available space.
         year (int): The year for which the calendar is generated.
@@ -23,22 +216,17 @@ def generate_calendar_html(tasks_df, no_wrap_text, year, task_colors, prefix_lab
         prefix_label (bool): Whether to prefix task names with their labels.
         month (int or str, optional): If provided, generates only the calendar for this month.
                                      Can be an integer (1-12) or a month name (e.g., "January").
+        out (file-like, optional): If provided, the HTML is written to this text stream month by
+                                   month instead of being built up in memory.
 
     Returns:
-        str: The generated HTML content as a string.
+        str: The generated HTML content as a string, or None if it was written to `out`.
     """
 
     # --- Wrap tasks ---
     wrapping = "nowrap" if no_wrap_text else "wrap"
 
     # --- Task Processing ---
-    tasks_by_day = {}  # {date_obj: [task_name1, task_name2, ...]}
-
-    # Ensure date columns are datetime objects, coercing errors
-    tasks_df["Start date"] = pd.to_datetime(tasks_df["Start date"], errors="coerce")
-    tasks_df["Due date"] = pd.to_datetime(tasks_df["Due date"], errors="coerce")
-    tasks_df["Completed Date"] = pd.to_datetime(tasks_df["Completed Date"], errors="coerce")
-
     # For tasks with a valid Completed Date, set the Due Date to the Completed Date
     tasks_df.loc[tasks_df["Completed Date"].notna(), "Due date"] = tasks_df["Completed Date"]
 
@@ -48,31 +236,70 @@ def generate_calendar_html(tasks_df, no_wrap_text, year, task_colors, prefix_lab
     # Drop tasks with invalid dates
     tasks_df = tasks_df.dropna(subset=["Start date", "Due date"])
 
-    for _, task in tasks_df.iterrows():
-        start_date = task["Start date"].date()
-        due_date = task["Due date"].date()
-        task_name = task["Task Name"]
-
-        # Ensure we only process tasks relevant to the target year
-        if start_date.year > year or due_date.year < year:
-            continue
-
-        current_date = max(
-            start_date, datetime(year, 1, 1).date()
-        )  # Start from Jan 1st if task started earlier
-        end_date = min(due_date, datetime(year, 12, 31).date())  # End at Dec 31st if task ends later
-
-        while current_date <= end_date:
-            if current_date not in tasks_by_day:
-                tasks_by_day[current_date] = []
-            if (
-                task_name not in tasks_by_day[current_date]
-            ):  # Avoid duplicates on the same day if logic repeats
-                tasks_by_day[current_date].append(task_name)
-            current_date += timedelta(days=1)
+    # First label of every task, used to prefix task names
+    task_labels = {}
+    if prefix_label and "Labels" in tasks_df.columns:
+        first_rows = tasks_df.drop_duplicates("Task Name")
+        task_labels = {
+            task_name: label
+            for task_name, label in zip(first_rows["Task Name"], first_rows["Labels"], strict=True)
+            if pd.notna(label)
+        }
+
+    # Ensure we only process tasks relevant to the target year
+    year_start = pd.Timestamp(year, 1, 1)
+    tasks_df = tasks_df[
+        (tasks_df["Start date"] < pd.Timestamp(year + 1, 1, 1)) & (tasks_df["Due date"] >= year_start)
+    ]
+
+    # Expand every task into one (day, task name) pair per day it covers within the year,
+    # starting from Jan 1st if the task started earlier and ending at Dec 31st if it ends later.
+    # Tasks due before they start end up with an empty span.
+    starts = tasks_df["Start date"].dt.normalize().clip(lower=year_start)
+    ends = tasks_df["Due date"].dt.normalize().clip(upper=pd.Timestamp(year, 12, 31))
+    spans = np.maximum((ends - starts).dt.days.to_numpy() + 1, 0)
+    # Position of every pair within its task's span
+    day_offsets = np.arange(spans.sum()) - np.repeat(spans.cumsum() - spans, spans)
+    task_days = pd.DataFrame(
+        {
+            "day": np.repeat(starts.to_numpy(), spans) + day_offsets.astype("timedelta64[D]"),
+            "task": np.repeat(tasks_df["Task Name"].to_numpy(), spans),
+        }
+    ).drop_duplicates()  # Avoid duplicates on the same day if a task name repeats
+
+    # {(year, month, day): [task_name1, task_name2, ...]}, tasks keep the order of the rows in the sheet
+    tasks_by_day = {
+        (day.year, day.month, day.day): day_tasks
+        for day, day_tasks in task_days.groupby("day")["task"].agg(list).items()
+    }
+
+    # A task looks the same on every day it appears, so its HTML is built once
+    task_names = task_days["task"].unique()
+    # Tasks without an assigned color fall back to light gray
+    task_colors = dict.fromkeys(task_names, "#f0f0f0") | task_colors
+    task_spans = {}
+    for task_name in task_names:
+        bg_color = task_colors[task_name]
+
+        if prefix_label:
+            labels = task_labels.get(task_name, "")
+            labeled_task_name = f"{labels}{task_name}" if labels else task_name
+        else:
+            labeled_task_name = task_name
+
+        # Basic HTML escaping for task name in title attribute
+        escaped_task_name = labeled_task_name.translate(ESCAPE_TABLE)
+        task_spans[task_name] = (
+            f'        <span class="task" title="{escaped_task_name}" style="background-color: '
+            f'{bg_color};">{escaped_task_name}</span>'
+        )
 
     # --- HTML Generation ---
-    # Using a list to build the HTML is more efficient than string concatenation
+    # Using a list to build the HTML is more efficient than string concatenation,
+    # the list is flushed to the output after every month to keep it small
+    buffer = None
+    if out is None:
+        buffer = out = io.StringIO()
     
     # Convert month to integer if it's a string
     month_num = None
@@ -80,8 +307,7 @@ def generate_calendar_html(tasks_df, no_wrap_text, year, task_colors, prefix_lab
         if isinstance(month, str):
             try:
                 # Try to convert month name to number
-                month_names = {name.lower(): num for num, name in enumerate(calendar.month_name) if num > 0}
-                month_num = month_names.get(month.lower())
+                month_num = MONTH_NUMBERS.get(month.lower())
                 if month_num is None:
                     # Try to parse as a number
                     month_num = int(month)
@@ -101,6 +327,8 @@ def generate_calendar_html(tasks_df, no_wrap_text, year, task_colors, prefix_lab
         title_text = f"{month_name} {year} Calendar"
         grid_columns = "1fr"  # Single column for month view
     
+    css = CSS_TEMPLATE.format(grid_columns=grid_columns, wrapping=wrapping)
+
     html_parts = [
         f"""<!DOCTYPE html>
 <html lang="en">
@@ -108,43 +336,7 @@ def generate_calendar_html(tasks_df, no_wrap_text, year, task_colors, prefix_lab
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Planner Calendar - {year}</title>
-    <style>
-        body {{ font-family: sans-serif; font-size: 8px; }}
-        .year-grid {{ display: grid; grid-template-columns: {grid_columns}; gap: 20px; }}
-        .month {{ border: 1px solid #ccc; padding: 5px; }}
-        .month-title {{ text-align: center; font-weight: bold; font-size: 12px; margin-bottom: 5px; }}
-        .calendar-grid {{ display: grid; grid-template-columns: repeat(7, 1fr); border-collapse: collapse; 
-        table-layout: fixed; width: 100%; }}
-        .day-header {{ text-align: center; font-weight: bold; background-color: #f0f0f0; font-size: 9px; 
-        padding: 2px; border: 1px solid #ddd; }}
-        .day {{ border: 1px solid #ddd; vertical-align: top; height: 70px; /* Adjust as needed */ 
-        padding: 2px; overflow: hidden; position: relative; }}
-        .day.other-month {{ background-color: #f9f9f9; color: #aaa; }}
-        .day-number {{ position: absolute; top: 1px; left: 1px; font-weight: bold; font-size: 9px; 
-        color: #333; }}
-        .tasks {{ margin-top: 12px; /* Space below day number */ line-height: 1.1; }}
-        .task {{ display: block; white-space: {wrapping}; overflow: hidden; text-overflow: ellipsis; 
-        margin-bottom: 1px; padding: 0 1px; border-radius: 2px; border: 1px solid #ccc; color: #000; 
-        /* Ensure text is black */}}
-        /* Single month view */
-        .single-month .day {{ height: 100px; }}
-        .single-month .day-number {{ font-size: 12px; }}
-        .single-month .day-header {{ font-size: 12px; }}
-        .single-month .task {{ font-size: 9px; }}
-        /* Print specific styles */
-        @media print {{
-            @page {{ size: 17in 11in landscape; margin: 0.5in; }} /* 11x17 Landscape */
-            body {{ font-size: 7pt; -webkit-print-color-adjust: exact; print-color-adjust: exact; }}
-            .year-grid {{ gap: 15px; }}
-            .month {{ page-break-inside: avoid; border: 1px solid #aaa; }}
-            .day {{ height: 65px; border: 1px solid #ccc; }}
-            .day-header {{ font-size: 8pt; padding: 1px; }}
-            .day-number {{ font-size: 8pt; }}
-            .task {{ border: 1px solid #b0dde4; font-size: 5pt;}}
-            /* Hide non-essential elements for print */
-            /* Add any elements here you want to hide during printing */
-        }}
-    </style>
+    <style>{css}</style>
 </head>
 <body>
     <h1 style="text-align: center;">{title_text}</h1>
@@ -159,65 +351,87 @@ def generate_calendar_html(tasks_df, no_wrap_text, year, task_colors, prefix_lab
 
     for current_month in month_range:
         month_name = calendar.month_name[current_month]
-        month_weeks = cal.monthdatescalendar(year, current_month)
 
-        html_parts.append('<div class="month">')
-        html_parts.append(f'  <div class="month-title">{month_name} {year}</div>')
-        html_parts.append('  <div class="calendar-grid">')
+        html_parts.append(
+            '<div class="month">'
+            f'  <div class="month-title">{month_name} {year}</div>'
+            '  <div class="calendar-grid">'
+        )
 
         # Day Headers
-        for day_abbr in ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]:
-            html_parts.append(f'    <div class="day-header">{day_abbr}</div>')
-
-        # Days
-        for week in month_weeks:
-            for day_date in week:
-                day_class = "day"
-                if day_date.month != month_num:
-                    day_class += " other-month"
-
-                html_parts.append(f'    <div class="{day_class}">')
-                html_parts.append(f'      <div class="day-number">{day_date.day}</div>')
-                html_parts.append('      <div class="tasks">')
-
-                # Add tasks for this day
-                tasks_today = tasks_by_day.get(day_date, [])
-                for task_name in tasks_today:
-                    # Basic HTML escaping for task name in title attribute
-                    bg_color = task_colors.get(task_name, "#f0f0f0")  # Get color, fallback to light gray
-
-                    if prefix_label:
-                        labels = tasks_df.loc[tasks_df["Task Name"] == task_name, "Labels"]
-                        labels = "" if labels.empty or labels.isna().all() else labels.values[0]
-                        labeled_task_name = f"{labels}{task_name}" if labels else task_name
-                    else:
-                        labeled_task_name = task_name
-
-                    escaped_task_name = (
-                        labeled_task_name.replace(";", "")
-                        .replace("&", "&amp;")
-                        .replace("<", "&lt;")
-                        .replace(">", "&gt;")
-                        .replace('"', "&quot;")
-                        .replace("'", "&#39;")
-                    )
-                    html_parts.append(
-                        f'        <span class="task" title="{escaped_task_name}" style="background-color: '
-                        f'{bg_color};">{escaped_task_name}</span>'
-                    )
-
-                html_parts.append("      </div>")  # close tasks
-                html_parts.append("    </div>")  # close day
-
-        html_parts.append("  </div>")  # close calendar-grid
-        html_parts.append("</div>")  # close month
+        html_parts.append(DAY_HEADERS_HTML)
+
+        # Days, as plain (year, month, day) numbers for the complete weeks covering the month
+        for day_key in cal.itermonthdays3(year, current_month):
+            day_class = "day"
+            if day_key[1] != current_month:
+                day_class += " other-month"
+
+            # Add tasks for this day
+            tasks_html = "".join([task_spans[task_name] for task_name in tasks_by_day.get(day_key, [])])
+
+            # One string per day cell
+            html_parts.append(
+                f'    <div class="{day_class}">'
+                f'      <div class="day-number">{day_key[2]}</div>'
+                f'      <div class="tasks">{tasks_html}'
+                "      </div>"  # close tasks
+                "    </div>"  # close day
+            )
+
+        html_parts.append(
+            "  </div>"  # close calendar-grid
+            "</div>"  # close month
+        )
+
+        out.write("".join(html_parts))
+        html_parts.clear()
 
     html_parts.append("""
     </div> <!-- close year-grid -->
 </body>
 </html>
 """)
-    return "".join(html_parts)
+    out.write("".join(html_parts))
+    return buffer.getvalue() if buffer is not None else None
+
+
+def write_calendar_html(output_file, tasks_df, no_wrap_text, year, task_colors, prefix_label, month=None):
+    """
+    Writes the calendar HTML to a file, replacing an existing file only once generation succeeded.
+
+    The HTML is streamed into a temporary file next to the real output file (following symlinks),
+    which then replaces it with the previous file's permissions, so a failed generation leaves a
+    previously generated calendar untouched.
+
+    Args:
+        output_file (str): Path of the HTML file to write.
+        tasks_df (pd.DataFrame): DataFrame containing the tasks, see generate_calendar_html.
+        no_wrap_text (bool): Whether to prevent task names from wrapping to the next line.
+        year (int): The year for which the calendar is generated.
+        task_colors (dict): A dictionary mapping task names to their respective color codes.
+        prefix_label (bool): Whether to prefix task names with their labels.
+        month (int or str, optional): If provided, generates only the calendar for this month.
+    """
+    # Replace the file a symlink points to, not the symlink itself
+    target_file = os.path.realpath(output_file)
+    temp_file = os.path.join(
+        os.path.dirname(target_file), f".{os.path.basename(target_file)}.{uuid.uuid4().hex}.tmp"
+    )
+    try:
+        f = open(temp_file, "x", encoding="utf-8", buffering=1 << 20)  # noqa: SIM115
+    except OSError as e:
+        # Report the output path rather than the temporary file the user never asked for
+        raise OSError(e.errno, e.strerror, output_file) from e
+    try:
+        with f:
+            generate_calendar_html(tasks_df, no_wrap_text, year, task_colors, prefix_label, month, out=f)
+        if os.path.exists(target_file):
+            shutil.copymode(target_file, temp_file)
+        os.replace(temp_file, target_file)
+    except BaseException:
+        os.remove(temp_file)
+        raise
 
 
 def main():
@@ -293,8 +507,8 @@ def main():
 
     # --- Read Excel File ---
     try:
-        # Specify the sheet name explicitly
-        tasks_df = pd.read_excel(args.excel_file, sheet_name="Tasks", engine="openpyxl")
+        # Reads the 'Tasks' sheet, limited to the columns used by the calendar
+        tasks_df = read_tasks(args.excel_file)
     except FileNotFoundError:
         print(f"Error: File not found at {args.excel_file}", file=sys.stderr)
         sys.exit(1)
@@ -319,74 +533,29 @@ def main():
         sys.exit(1)
 
     required_columns = ["Task Name", "Start date", "Due date"]
-    missing_cols = [col for col in required_columns if col not in tasks_df.columns]
+    columns = set(tasks_df.columns)
+    missing_cols = [col for col in required_columns if col not in columns]
     if missing_cols:
         print(f"Error: Missing required columns in 'Tasks' sheet: {', '.join(missing_cols)}", file=sys.stderr)
         sys.exit(1)
 
     # --- Generate Task Colors ---
-    unique_tasks = sorted(tasks_df["Task Name"].astype(str).unique())  # Ensure consistent order
-    task_colors = {}
-    saturation = max(0.0, min(1.0, args.color_saturation))
-    lightness = max(0.0, min(1.0, args.color_lightness))
-
-    # Use a hash of the task name (or label) for potentially more stable color assignments
-    # if the task list changes slightly run-to-run.
-    for task_index, task_name in enumerate(unique_tasks):
-        hue = None  # Initialize hue
-        if args.color_by_label:
-            matching_rows = tasks_df.loc[tasks_df["Task Name"] == task_name]
-            if not matching_rows.empty:
-                label = matching_rows["Labels"].iloc[0]  # Get the first label
-                if pd.notna(label):  # Check if label exists and is not NaN
-                    try:
-                        # Hash the label
-                        hash_object = hashlib.md5(str(label).encode())  # Use str() for safety
-                        hash_digest = hash_object.hexdigest()
-                        if args.alternate_colors:
-                            hue = (int(HUE_STEP * task_index) % 360) / 360.0
-                        else:
-                            hue = (int(hash_digest, 16) % 360) / 360.0
-                    except AttributeError:  # Handle potential encoding errors
-                        pass  # Fall through to task name hashing
-
-        if args.color_by_bucket:
-            matching_rows = tasks_df.loc[tasks_df["Task Name"] == task_name]
-            if not matching_rows.empty:
-                bucket = matching_rows["Bucket Name"].iloc[0]  # Get the first bucket
-                if pd.notna(bucket):  # Check if bucket exists and is not NaN
-                    try:
-                        # Hash the bucket
-                        hash_object = hashlib.md5(str(bucket).encode())  # Use str() for safety
-                        hash_digest = hash_object.hexdigest()
-                        if args.alternate_colors:
-                            hue = (int(HUE_STEP * task_index) % 360) / 360.0
-                        else:
-                            hue = (int(hash_digest, 16) % 360) / 360.0
-                    except AttributeError:  # Handle potential encoding errors
-                        pass  # Fall through to task name hashing
-
-        print(f"Task: {task_name}, Hue: {hue}")
-
-        # If hue wasn't set by label (either disabled, no matching rows, NaN label, or encoding error)
-        if hue is None:
-            # Hash the task name
-            hash_object = hashlib.md5(str(task_name).encode())
-            hash_digest = hash_object.hexdigest()
-            hue = (int(hash_digest, 16) % 360) / 360.0
-
-        # Generate color
-        rgb = colorsys.hls_to_rgb(hue, lightness, saturation)
-        hex_color = f"#{int(rgb[0] * 255):02x}{int(rgb[1] * 255):02x}{int(rgb[2] * 255):02x}"
-        task_colors[task_name] = hex_color
+    task_colors = generate_task_colors(
+        tasks_df,
+        max(0.0, min(1.0, args.color_saturation)),
+        max(0.0, min(1.0, args.color_lightness)),
+        args.color_by_label,
+        args.color_by_bucket,
+        args.alternate_colors,
+    )
 
     # Determine the year for the calendar
     target_year = args.year
     if not target_year:
-        # Find the earliest year from valid start dates
-        valid_start_dates = pd.to_datetime(tasks_df["Start date"], errors="coerce").dropna()
-        if not valid_start_dates.empty:
-            target_year = valid_start_dates.min().year
+        # Find the earliest year from valid start dates, NaT is skipped
+        earliest = tasks_df["Start date"].min()
+        if pd.notna(earliest):
+            target_year = earliest.year
         else:
             # If no valid start dates, default to current year or ask user? Defaulting for now.
             target_year = datetime.now().year
@@ -409,23 +578,26 @@ def main():
                 sys.exit(1)
         except ValueError:
             # Try to match month name
-            month_names = {name.lower(): num for num, name in enumerate(calendar.month_name) if num > 0}
-            target_month = month_names.get(args.month.lower())
+            target_month = MONTH_NUMBERS.get(args.month.lower())
             if target_month is None:
                 print(f"Error: Invalid month name: {args.month}", file=sys.stderr)
                 valid_months = ', '.join(name for name in calendar.month_name[1:])
                 print(f"Valid month names are: {valid_months}", file=sys.stderr)
                 sys.exit(1)
     
-    html_content = generate_calendar_html(
-        tasks_df, args.no_wrap_text, target_year, task_colors, args.prefix_labels, target_month
-    )
-
     try:
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(html_content)
+        # Stream the HTML into the output file, an existing file is only replaced on success
+        write_calendar_html(
+            args.output,
+            tasks_df,
+            args.no_wrap_text,
+            target_year,
+            task_colors,
+            args.prefix_labels,
+            target_month,
+        )
         print(f"Successfully generated calendar HTML: {args.output}")
-    except Exception as e:
+    except OSError as e:
         print(f"Error writing HTML file: {e}", file=sys.stderr)
         sys.exit(1)
 